@@ -1,15 +1,20 @@
 from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Query
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
+from pymongo.errors import OperationFailure
+import redis.asyncio as aioredis
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone
+from functools import partial
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -19,16 +24,43 @@ from services.freeagent_service import FreeAgentService
 from services.sync_service import SyncService
 from services.freeagent_oauth import FreeAgentOAuth
 
+# Current UTC time, bound once for model default factories and routes
+_utcnow = partial(datetime.now, timezone.utc)
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# The pool must cover the invoice and payment sync workers running together
+# (2 x SyncService concurrency) plus API requests
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=5,
+    maxIdleTimeMS=300000,
+    retryWrites=True
+)
 db = client[os.environ['DB_NAME']]
 
+# Sync logs are high-volume and disposable, so acknowledge them from memory;
+# credentials must survive a primary failover
+sync_logs_collection = db.get_collection('sync_logs', write_concern=WriteConcern(w=1, j=False))
+credentials_collection = db.get_collection('credentials', write_concern=WriteConcern(w='majority', j=True))
+
+# Redis connection (OAuth state store)
+redis_client = aioredis.from_url(
+    os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    decode_responses=True
+)
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# API service instances, reused across syncs until the credentials change
+app.state.whmcs = None
+app.state.freeagent = None
+app.state.services_version = None
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -43,8 +75,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# OAuth state storage (in production, use Redis or database)
-oauth_states = {}
+# OAuth states expire if the user never completes the FreeAgent approval
+OAUTH_STATE_TTL_SECONDS = 600
+
+# Only one sync may run at a time across all workers; the TTL frees the
+# lock if a worker dies mid-sync
+SYNC_LOCK_KEY = "sync:lock"
+SYNC_LOCK_TTL_SECONDS = 3600
+
+# Upper bound on a single sync run, well inside the hourly schedule
+SYNC_TIMEOUT_SECONDS = 1500
+
+# Delete the lock only if it still holds the caller's token
+RELEASE_SYNC_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# MongoDB error code for a duplicate key, raised by unique index builds over duplicates
+DUPLICATE_KEY_ERROR_CODE = 11000
 
 
 # Define Models
@@ -57,12 +108,12 @@ class Credentials(BaseModel):
     freeagent_access_token: Optional[str] = None
     freeagent_refresh_token: Optional[str] = None
     freeagent_token_expires_at: Optional[datetime] = None
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=_utcnow)
 
 
 class SyncLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    timestamp: datetime = Field(default_factory=_utcnow)
     sync_type: str  # 'manual' or 'automatic'
     status: str  # 'success', 'error', 'running'
     invoices_processed: int = 0
@@ -71,6 +122,12 @@ class SyncLog(BaseModel):
     payments_synced: int = 0
     errors: List[str] = []
     message: Optional[str] = None
+    
+    def to_mongo(self) -> Dict[str, Any]:
+        """Document for Mongo, keyed by the log id as _id"""
+        doc = self.model_dump()
+        doc['_id'] = doc.pop('id')
+        return doc
 
 
 class SyncStatus(BaseModel):
@@ -83,7 +140,114 @@ class ClientMapping(BaseModel):
     whmcs_client_id: int
     whmcs_email: str
     freeagent_contact_url: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
+
+
+# Fields that change between a sync log's creation and its completion
+SYNC_LOG_RESULT_FIELDS = {
+    'status', 'invoices_processed', 'invoices_created',
+    'clients_created', 'payments_synced', 'errors', 'message'
+}
+
+
+# Maximum sync logs a single /sync/logs request may return
+SYNC_LOGS_MAX_LIMIT = 500
+
+
+# Fields rendered by the log views; logs are keyed by their id as _id,
+# while older logs also carry an explicit id field
+SYNC_LOG_LIST_PROJECTION = {
+    '_id': 0,
+    'id': {'$ifNull': ['$id', '$_id']},
+    'timestamp': 1,
+    'sync_type': 1,
+    'status': 1,
+    'invoices_processed': 1,
+    'invoices_created': 1,
+    'clients_created': 1,
+    'payments_synced': 1,
+    'errors': 1,
+    'message': 1
+}
+
+
+async def save_sync_log_result(sync_log: SyncLog):
+    """Write the outcome of a sync run in a single update"""
+    await sync_logs_collection.update_one(
+        {'_id': sync_log.id},
+        {'$set': sync_log.model_dump(include=SYNC_LOG_RESULT_FIELDS)}
+    )
+
+
+async def get_services(creds: Dict[str, Any]):
+    """Return WHMCS and FreeAgent services, rebuilding them when credentials change"""
+    # Every credential write bumps updated_at, so it doubles as a version
+    version = creds.get('updated_at')
+    
+    if app.state.freeagent is None or app.state.services_version != version:
+        if app.state.freeagent is not None:
+            await app.state.whmcs.aclose()
+            await app.state.freeagent.aclose()
+        
+        app.state.whmcs = WHMCSService(
+            url=creds.get('whmcs_url'),
+            identifier=creds.get('whmcs_identifier'),
+            secret=creds.get('whmcs_secret')
+        )
+        
+        app.state.freeagent = FreeAgentService(
+            client_id=creds.get('freeagent_client_id'),
+            client_secret=creds.get('freeagent_client_secret'),
+            access_token=creds.get('freeagent_access_token'),
+            refresh_token=creds.get('freeagent_refresh_token')
+        )
+        
+        app.state.services_version = version
+    
+    return app.state.whmcs, app.state.freeagent
+
+
+async def acquire_sync_lock() -> Optional[str]:
+    """Take the sync lock, returning its token or None if a sync is already running"""
+    token = str(uuid.uuid4())
+    if await redis_client.set(SYNC_LOCK_KEY, token, nx=True, ex=SYNC_LOCK_TTL_SECONDS):
+        return token
+    return None
+
+
+async def release_sync_lock(token: str):
+    """Release the sync lock if it is still held with this token"""
+    await redis_client.eval(RELEASE_SYNC_LOCK_SCRIPT, 1, SYNC_LOCK_KEY, token)
+
+
+async def run_sync(sync_service: SyncService, sync_type: str) -> Dict[str, Any]:
+    """Run invoice and payment sync concurrently within SYNC_TIMEOUT_SECONDS"""
+    async def sync_payments():
+        # A payment sync failure shouldn't fail the invoice sync
+        try:
+            return await sync_service.sync_payments_from_freeagent()
+        except Exception as e:
+            logger.warning("Payment sync failed during %s sync: %s", sync_type, e)
+            return {}
+    
+    try:
+        async with asyncio.timeout(SYNC_TIMEOUT_SECONDS):
+            async with asyncio.TaskGroup() as tg:
+                invoice_task = tg.create_task(sync_service.sync_invoices())
+                payment_task = tg.create_task(sync_payments())
+    except TimeoutError:
+        raise Exception(f"Sync timed out after {SYNC_TIMEOUT_SECONDS} seconds")
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0]
+    
+    result = invoice_task.result()
+    payment_result = payment_task.result()
+    
+    result['payments_synced'] = payment_result.get('payments_synced', 0)
+    if payment_result.get('message'):
+        result['message'] += f" | {payment_result['message']}"
+    
+    return result
 
 
 # Background sync function
@@ -92,7 +256,7 @@ async def perform_sync():
     logger.info("Starting automatic sync...")
     
     # Get credentials
-    creds = await db.credentials.find_one({})
+    creds = await credentials_collection.find_one({})
     if not creds:
         logger.error("No credentials found for automatic sync")
         return
@@ -102,42 +266,28 @@ async def perform_sync():
         logger.error("No FreeAgent access token found")
         return
     
+    lock_token = await acquire_sync_lock()
+    if not lock_token:
+        logger.info("Sync is already running, skipping automatic sync")
+        return
+    
     # Create sync log
     sync_log = SyncLog(
         sync_type='automatic',
         status='running',
         message='Starting automatic sync...'
     )
-    await db.sync_logs.insert_one(sync_log.dict())
     
     try:
-        # Initialize services
-        whmcs_service = WHMCSService(
-            url=creds.get('whmcs_url'),
-            identifier=creds.get('whmcs_identifier'),
-            secret=creds.get('whmcs_secret')
-        )
+        await sync_logs_collection.insert_one(sync_log.to_mongo())
         
-        freeagent_service = FreeAgentService(
-            client_id=creds.get('freeagent_client_id'),
-            client_secret=creds.get('freeagent_client_secret'),
-            access_token=creds.get('freeagent_access_token'),
-            refresh_token=creds.get('freeagent_refresh_token')
-        )
+        # Get services (reused while credentials are unchanged)
+        whmcs_service, freeagent_service = await get_services(creds)
         
         sync_service = SyncService(whmcs_service, freeagent_service, db)
         
-        # Perform invoice sync
-        result = await sync_service.sync_invoices()
-        
-        # Perform payment sync from FreeAgent to WHMCS
-        try:
-            payment_result = await sync_service.sync_payments_from_freeagent()
-            result['payments_synced'] = payment_result.get('payments_synced', 0)
-            if payment_result.get('message'):
-                result['message'] += f" | {payment_result['message']}"
-        except Exception as e:
-            logger.warning(f"Payment sync failed during automatic sync: {str(e)}")
+        # Perform invoice sync and payment sync from FreeAgent to WHMCS
+        result = await run_sync(sync_service, sync_log.sync_type)
         
         # Update sync log
         sync_log.status = 'success'
@@ -147,23 +297,53 @@ async def perform_sync():
         sync_log.payments_synced = result.get('payments_synced', 0)
         sync_log.message = result.get('message', 'Sync completed successfully')
         
-        await db.sync_logs.update_one(
-            {'id': sync_log.id},
-            {'$set': sync_log.dict()}
-        )
+        await save_sync_log_result(sync_log)
         
-        logger.info(f"Automatic sync completed: {result}")
+        logger.info("Automatic sync completed: %s", result)
         
     except Exception as e:
-        logger.error(f"Automatic sync failed: {str(e)}")
+        logger.error("Automatic sync failed: %s", e)
         sync_log.status = 'error'
         sync_log.errors = [str(e)]
         sync_log.message = f'Sync failed: {str(e)}'
         
-        await db.sync_logs.update_one(
-            {'id': sync_log.id},
-            {'$set': sync_log.dict()}
+        await save_sync_log_result(sync_log)
+    
+    finally:
+        await release_sync_lock(lock_token)
+
+
+async def ensure_unique_index(collection, field: str):
+    """Create a unique index on field, falling back to a plain index if duplicates exist"""
+    fallback_name = f"{field}_nonunique"
+    
+    # Mongo won't build a unique index over the same key as the fallback, so
+    # drop it first; it comes straight back if the duplicates are still there
+    if fallback_name in await collection.index_information():
+        await collection.drop_index(fallback_name)
+    
+    try:
+        await collection.create_index(field, unique=True)
+    except OperationFailure as e:
+        if e.code != DUPLICATE_KEY_ERROR_CODE:
+            raise
+        # Deployments predating the upserts may hold duplicate rows
+        logger.error(
+            "Could not create unique index on %s.%s, remove the duplicate documents and restart: %s",
+            collection.name, field, e
         )
+        await collection.create_index(field, name=fallback_name)
+
+
+async def ensure_indexes():
+    """Create the indexes used by the sync and API queries"""
+    await sync_logs_collection.create_index([("timestamp", -1)])
+    await sync_logs_collection.create_index([("status", 1), ("timestamp", -1)])
+    await credentials_collection.create_index("updated_at")
+    await ensure_unique_index(db.client_mappings, "whmcs_client_id")
+    await db.client_mappings.create_index("whmcs_email")
+    await ensure_unique_index(db.synced_invoices, "whmcs_invoice_id")
+    await db.synced_invoices.create_index("payment_synced")
 
 
 # Routes
@@ -177,14 +357,14 @@ async def save_credentials(credentials: Credentials):
     """Save API credentials"""
     try:
         # Update or insert credentials
-        credentials.updated_at = datetime.now(timezone.utc)
-        await db.credentials.delete_many({})  # Only keep one set of credentials
-        await db.credentials.insert_one(credentials.dict())
+        credentials.updated_at = _utcnow()
+        # Only keep one set of credentials
+        await credentials_collection.replace_one({}, credentials.model_dump(), upsert=True)
         
         logger.info("Credentials saved successfully")
         return {"status": "success", "message": "Credentials saved successfully"}
     except Exception as e:
-        logger.error(f"Error saving credentials: {str(e)}")
+        logger.error("Error saving credentials: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -192,7 +372,7 @@ async def save_credentials(credentials: Credentials):
 async def get_credentials():
     """Get API credentials (masked)"""
     try:
-        creds = await db.credentials.find_one({})
+        creds = await credentials_collection.find_one({})
         if not creds:
             return None
         
@@ -210,7 +390,7 @@ async def get_credentials():
         
         return masked_creds
     except Exception as e:
-        logger.error(f"Error getting credentials: {str(e)}")
+        logger.error("Error getting credentials: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -219,7 +399,7 @@ async def freeagent_authorize():
     """Initiate FreeAgent OAuth flow"""
     try:
         # Get credentials
-        creds = await db.credentials.find_one({})
+        creds = await credentials_collection.find_one({})
         if not creds or not creds.get('freeagent_client_id'):
             raise HTTPException(status_code=400, detail="FreeAgent credentials not configured")
         
@@ -236,18 +416,18 @@ async def freeagent_authorize():
         
         # Generate state for CSRF protection
         state = str(uuid.uuid4())
-        oauth_states[state] = {'timestamp': datetime.now(timezone.utc)}
+        await redis_client.set(f"oauth:state:{state}", "1", ex=OAUTH_STATE_TTL_SECONDS)
         
         # Get authorization URL
         auth_url = oauth.get_authorization_url(state=state)
         
-        logger.info(f"Redirecting to FreeAgent authorization: {auth_url}")
+        logger.info("Redirecting to FreeAgent authorization: %s", auth_url)
         return {"authorization_url": auth_url}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"OAuth authorization failed: {str(e)}")
+        logger.error("OAuth authorization failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -255,16 +435,15 @@ async def freeagent_authorize():
 async def freeagent_callback(code: str = Query(...), state: str = Query(None)):
     """Handle FreeAgent OAuth callback"""
     try:
-        # Verify state
-        if state and state not in oauth_states:
+        # Verify and consume state in one step
+        if state and not await redis_client.getdel(f"oauth:state:{state}"):
             raise HTTPException(status_code=400, detail="Invalid state parameter")
         
-        # Remove used state
-        if state:
-            oauth_states.pop(state, None)
-        
-        # Get credentials
-        creds = await db.credentials.find_one({})
+        # Get credentials (only the OAuth client pair is needed here)
+        creds = await credentials_collection.find_one(
+            {},
+            projection={'_id': 0, 'freeagent_client_id': 1, 'freeagent_client_secret': 1}
+        )
         if not creds:
             raise HTTPException(status_code=400, detail="Credentials not found")
         
@@ -281,14 +460,14 @@ async def freeagent_callback(code: str = Query(...), state: str = Query(None)):
         token_data = await oauth.exchange_code_for_token(code)
         
         # Store tokens
-        await db.credentials.update_one(
+        await credentials_collection.update_one(
             {},
             {
                 '$set': {
                     'freeagent_access_token': token_data.get('access_token'),
                     'freeagent_refresh_token': token_data.get('refresh_token'),
-                    'freeagent_token_expires_at': datetime.now(timezone.utc),
-                    'updated_at': datetime.now(timezone.utc)
+                    'freeagent_token_expires_at': _utcnow(),
+                    'updated_at': _utcnow()
                 }
             }
         )
@@ -302,7 +481,7 @@ async def freeagent_callback(code: str = Query(...), state: str = Query(None)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"OAuth callback failed: {str(e)}")
+        logger.error("OAuth callback failed: %s", e)
         frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
         return RedirectResponse(url=f"{frontend_url}/settings?oauth=error&message={str(e)}")
 
@@ -311,14 +490,14 @@ async def freeagent_callback(code: str = Query(...), state: str = Query(None)):
 async def freeagent_disconnect():
     """Disconnect FreeAgent (remove tokens)"""
     try:
-        await db.credentials.update_one(
+        await credentials_collection.update_one(
             {},
             {
                 '$set': {
                     'freeagent_access_token': None,
                     'freeagent_refresh_token': None,
                     'freeagent_token_expires_at': None,
-                    'updated_at': datetime.now(timezone.utc)
+                    'updated_at': _utcnow()
                 }
             }
         )
@@ -327,16 +506,17 @@ async def freeagent_disconnect():
         return {"status": "success", "message": "FreeAgent disconnected successfully"}
         
     except Exception as e:
-        logger.error(f"Disconnect failed: {str(e)}")
+        logger.error("Disconnect failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @api_router.post("/sync/manual")
 async def manual_sync(background_tasks: BackgroundTasks):
     """Trigger manual sync"""
+    lock_token = None
     try:
         # Get credentials
-        creds = await db.credentials.find_one({})
+        creds = await credentials_collection.find_one({})
         if not creds:
             raise HTTPException(status_code=400, detail="No credentials configured. Please configure credentials first.")
         
@@ -345,8 +525,8 @@ async def manual_sync(background_tasks: BackgroundTasks):
             raise HTTPException(status_code=400, detail="FreeAgent not connected. Please connect to FreeAgent first.")
         
         # Check if sync is already running
-        running_sync = await db.sync_logs.find_one({'status': 'running'})
-        if running_sync:
+        lock_token = await acquire_sync_lock()
+        if not lock_token:
             raise HTTPException(status_code=400, detail="Sync is already running")
         
         # Create sync log
@@ -355,35 +535,15 @@ async def manual_sync(background_tasks: BackgroundTasks):
             status='running',
             message='Starting manual sync...'
         )
-        await db.sync_logs.insert_one(sync_log.dict())
+        await sync_logs_collection.insert_one(sync_log.to_mongo())
         
-        # Initialize services
-        whmcs_service = WHMCSService(
-            url=creds.get('whmcs_url'),
-            identifier=creds.get('whmcs_identifier'),
-            secret=creds.get('whmcs_secret')
-        )
-        
-        freeagent_service = FreeAgentService(
-            client_id=creds.get('freeagent_client_id'),
-            client_secret=creds.get('freeagent_client_secret'),
-            access_token=creds.get('freeagent_access_token'),
-            refresh_token=creds.get('freeagent_refresh_token')
-        )
+        # Get services (reused while credentials are unchanged)
+        whmcs_service, freeagent_service = await get_services(creds)
         
         sync_service = SyncService(whmcs_service, freeagent_service, db)
         
-        # Perform invoice sync
-        result = await sync_service.sync_invoices()
-        
-        # Perform payment sync from FreeAgent to WHMCS
-        try:
-            payment_result = await sync_service.sync_payments_from_freeagent()
-            result['payments_synced'] = payment_result.get('payments_synced', 0)
-            if payment_result.get('message'):
-                result['message'] += f" | {payment_result['message']}"
-        except Exception as e:
-            logger.warning(f"Payment sync failed during manual sync: {str(e)}")
+        # Perform invoice sync and payment sync from FreeAgent to WHMCS
+        result = await run_sync(sync_service, sync_log.sync_type)
         
         # Update sync log
         sync_log.status = 'success'
@@ -393,18 +553,15 @@ async def manual_sync(background_tasks: BackgroundTasks):
         sync_log.payments_synced = result.get('payments_synced', 0)
         sync_log.message = result.get('message', 'Sync completed successfully')
         
-        await db.sync_logs.update_one(
-            {'id': sync_log.id},
-            {'$set': sync_log.dict()}
-        )
+        await save_sync_log_result(sync_log)
         
-        logger.info(f"Manual sync completed: {result}")
+        logger.info("Manual sync completed: %s", result)
         return {"status": "success", "result": result}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Manual sync failed: {str(e)}")
+        logger.error("Manual sync failed: %s", e)
         
         # Update sync log if it exists
         if 'sync_log' in locals():
@@ -412,12 +569,13 @@ async def manual_sync(background_tasks: BackgroundTasks):
             sync_log.errors = [str(e)]
             sync_log.message = f'Sync failed: {str(e)}'
             
-            await db.sync_logs.update_one(
-                {'id': sync_log.id},
-                {'$set': sync_log.dict()}
-            )
+            await save_sync_log_result(sync_log)
         
         raise HTTPException(status_code=500, detail=str(e))
+    
+    finally:
+        if lock_token:
+            await release_sync_lock(lock_token)
 
 
 @api_router.get("/sync/status")
@@ -425,43 +583,44 @@ async def get_sync_status():
     """Get current sync status"""
     try:
         # Check if sync is running
-        running_sync = await db.sync_logs.find_one({'status': 'running'})
+        is_running = await redis_client.exists(SYNC_LOCK_KEY)
         
         # Get last sync
-        last_sync = await db.sync_logs.find_one(
+        last_sync = await sync_logs_collection.find_one(
             {'status': {'$in': ['success', 'error']}},
             sort=[('timestamp', -1)]
         )
         
         return {
-            'is_running': bool(running_sync),
+            'is_running': bool(is_running),
             'last_sync': last_sync.get('timestamp') if last_sync else None,
             'last_sync_status': last_sync.get('status') if last_sync else None,
             'next_sync': 'Every hour at :00'  # Since we run hourly
         }
     except Exception as e:
-        logger.error(f"Error getting sync status: {str(e)}")
+        logger.error("Error getting sync status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @api_router.get("/sync/logs")
-async def get_sync_logs(limit: int = 50):
+async def get_sync_logs(limit: int = Query(50, ge=1, le=SYNC_LOGS_MAX_LIMIT)):
     """Get sync logs"""
     try:
-        logs = await db.sync_logs.find().sort('timestamp', -1).limit(limit).to_list(limit)
-        # Remove MongoDB _id field
-        for log in logs:
-            log.pop('_id', None)
-        return logs
+        pipeline = [
+            {'$sort': {'timestamp': -1}},
+            {'$limit': limit},
+            {'$project': SYNC_LOG_LIST_PROJECTION}
+        ]
+        return await sync_logs_collection.aggregate(pipeline).to_list(limit)
     except Exception as e:
-        logger.error(f"Error getting sync logs: {str(e)}")
+        logger.error("Error getting sync logs: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+    return {"status": "healthy", "timestamp": _utcnow().isoformat()}
 
 
 # Include the router in the main app
@@ -486,11 +645,16 @@ async def startup_event():
         perform_sync,
         CronTrigger(hour='*', minute='0'),  # Run every hour at :00
         id='hourly_sync',
-        replace_existing=True
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=300
     )
     
     scheduler.start()
     logger.info("Scheduler started successfully")
+    
+    await ensure_indexes()
 
 
 @app.on_event("shutdown")
@@ -498,4 +662,8 @@ async def shutdown_event():
     """Shutdown scheduler and database connection"""
     logger.info("Shutting down...")
     scheduler.shutdown()
-    client.close()
\ No newline at end of file
+    if app.state.freeagent is not None:
+        await app.state.whmcs.aclose()
+        await app.state.freeagent.aclose()
+    client.close()
+    await redis_client.aclose()
\ No newline at end of file
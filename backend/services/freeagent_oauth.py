@@ -1,4 +1,4 @@
-import requests
+import httpx
 import logging
 from typing import Dict, Any, Optional
 from urllib.parse import urlencode
@@ -28,7 +28,7 @@ class FreeAgentOAuth:
             params['state'] = state
         
         url = f"{self.authorize_url}?{urlencode(params)}"
-        logger.info(f"Generated authorization URL")
+        logger.info("Generated authorization URL")
         return url
     
     async def exchange_code_for_token(self, code: str) -> Dict[str, Any]:
@@ -43,22 +43,22 @@ class FreeAgentOAuth:
             }
             
             logger.info("Exchanging authorization code for tokens...")
-            response = requests.post(
-                self.token_url,
-                data=data,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                timeout=30
-            )
+            async with httpx.AsyncClient(timeout=30) as http_client:
+                response = await http_client.post(
+                    self.token_url,
+                    data=data,
+                    headers={'Content-Type': 'application/x-www-form-urlencoded'}
+                )
             response.raise_for_status()
             
             token_data = response.json()
             logger.info("Successfully obtained access token")
             return token_data
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Token exchange failed: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response: {e.response.text}")
+        except httpx.HTTPError as e:
+            logger.error("Token exchange failed: %s", e)
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error("Response: %s", e.response.text)
             raise Exception(f"Failed to exchange code for token: {str(e)}")
     
     async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
@@ -72,20 +72,20 @@ class FreeAgentOAuth:
             }
             
             logger.info("Refreshing access token...")
-            response = requests.post(
-                self.token_url,
-                data=data,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                timeout=30
-            )
+            async with httpx.AsyncClient(timeout=30) as http_client:
+                response = await http_client.post(
+                    self.token_url,
+                    data=data,
+                    headers={'Content-Type': 'application/x-www-form-urlencoded'}
+                )
             response.raise_for_status()
             
             token_data = response.json()
             logger.info("Successfully refreshed access token")
             return token_data
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Token refresh failed: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response: {e.response.text}")
+        except httpx.HTTPError as e:
+            logger.error("Token refresh failed: %s", e)
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error("Response: %s", e.response.text)
             raise Exception(f"Failed to refresh token: {str(e)}")
\ No newline at end of file
@@ -1,10 +1,26 @@
-import requests
+import asyncio
+import httpx
 import logging
-from typing import List, Dict, Any, Optional
+import orjson
+import time
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlencode
 from datetime import datetime
+from .http_retry import send_with_retry
 
 logger = logging.getLogger(__name__)
 
+# FreeAgent allows 120 API requests per minute per user
+RATE_LIMIT_REQUESTS = 120
+RATE_LIMIT_PERIOD = 60.0
+
+# Maximum GET responses kept for conditional requests, least recently used dropped first
+ETAG_CACHE_MAX_ENTRIES = 256
+
+# Methods that are safe to resend after a transient failure
+IDEMPOTENT_METHODS = {'GET', 'PUT', 'DELETE'}
+
 
 class FreeAgentService:
     """FreeAgent API Service"""
@@ -15,88 +31,181 @@ class FreeAgentService:
         self.access_token = access_token
         self.refresh_token = refresh_token
         self.base_url = "https://api.freeagent.com/v2"
-        self.session = requests.Session()
         
+        headers = {}
         if self.access_token:
-            self.session.headers.update({
+            headers.update({
                 'Authorization': f'Bearer {self.access_token}',
                 'Content-Type': 'application/json'
             })
+        
+        # Shared async client so concurrent requests don't block the event loop;
+        # HTTP/2 multiplexes them over a single TLS connection
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0)
+        )
+        
+        # Contacts indexed by lowercased email, loaded lazily once per sync
+        self._contact_cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self._contact_lock = asyncio.Lock()
+        
+        # GET responses keyed by endpoint and query, stored with their ETag
+        self._etag_cache: OrderedDict[str, Tuple[str, Dict[str, Any]]] = OrderedDict()
+        
+        # Send times of recent requests, used to stay under the rate limit
+        self._request_times: deque = deque()
+        self._rate_lock = asyncio.Lock()
+    
+    async def aclose(self):
+        """Close the underlying HTTP client"""
+        await self._client.aclose()
     
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+    async def _throttle(self):
+        """Wait until another request fits within the FreeAgent rate limit"""
+        async with self._rate_lock:
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] >= RATE_LIMIT_PERIOD:
+                self._request_times.popleft()
+            
+            if len(self._request_times) >= RATE_LIMIT_REQUESTS:
+                await asyncio.sleep(RATE_LIMIT_PERIOD - (now - self._request_times[0]))
+                self._request_times.popleft()
+            
+            self._request_times.append(time.monotonic())
+    
+    async def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Make API request to FreeAgent"""
-        url = f"{self.base_url}{endpoint}"
+        cache_key = None
+        cached = None
+        if method == 'GET':
+            cache_key = f"{endpoint}?{urlencode(kwargs.get('params') or {})}"
+            cached = self._etag_cache.get(cache_key)
+            if cached:
+                self._etag_cache.move_to_end(cache_key)
+                kwargs['headers'] = {**kwargs.get('headers', {}), 'If-None-Match': cached[0]}
+        
+        async def send():
+            await self._throttle()
+            logger.debug("FreeAgent API request: %s %s", method, endpoint)
+            return await self._client.request(method, endpoint, **kwargs)
         
         try:
-            logger.debug(f"FreeAgent API request: {method} {endpoint}")
-            response = self.session.request(method, url, timeout=30, **kwargs)
+            # POSTs create records, so a retry after a server error could duplicate them
+            response = await send_with_retry(send, idempotent=method in IDEMPOTENT_METHODS)
+            
+            # Unchanged since the last fetch, reuse the cached body
+            if cached and response.status_code == 304:
+                return cached[1]
+            
             response.raise_for_status()
             
-            if response.content:
-                return response.json()
-            return {}
+            data = orjson.loads(response.content) if response.content else {}
+            
+            etag = response.headers.get('ETag')
+            if cache_key and etag:
+                self._etag_cache[cache_key] = (etag, data)
+                self._etag_cache.move_to_end(cache_key)
+                if len(self._etag_cache) > ETAG_CACHE_MAX_ENTRIES:
+                    self._etag_cache.popitem(last=False)
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"FreeAgent API request failed: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response: {e.response.text}")
+            return data
+            
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            logger.error("FreeAgent API request failed: %s", e)
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error("Response: %s", e.response.text)
             raise Exception(f"FreeAgent API request failed: {str(e)}")
     
     async def get_contacts(self) -> List[Dict[str, Any]]:
         """Get all contacts from FreeAgent"""
         try:
-            response = self._make_request('GET', '/contacts')
+            response = await self._make_request('GET', '/contacts')
             contacts = response.get('contacts', [])
-            logger.info(f"Retrieved {len(contacts)} contacts from FreeAgent")
+            logger.info("Retrieved %s contacts from FreeAgent", len(contacts))
             return contacts
             
         except Exception as e:
-            logger.error(f"Error getting contacts: {str(e)}")
+            logger.error("Error getting contacts: %s", e)
             raise
     
+    async def _load_contact_index(self):
+        """Fetch every contact page and index contacts by email"""
+        index = {}
+        page = 1
+        
+        while True:
+            response = await self._make_request('GET', '/contacts', params={'view': 'all', 'per_page': 100, 'page': page})
+            contacts = response.get('contacts', [])
+            if not contacts:
+                break
+            
+            for contact in contacts:
+                if contact.get('email'):
+                    index[contact['email'].lower()] = contact
+            page += 1
+        
+        logger.info("Indexed %s contacts from FreeAgent", len(index))
+        self._contact_cache = index
+    
+    def invalidate_contacts(self):
+        """Drop the cached contact index so the next lookup refetches it"""
+        self._contact_cache = None
+    
+    async def list_all_contacts_indexed_by_email(self) -> Dict[str, Dict[str, Any]]:
+        """Get all contacts keyed by lowercased email, fetching them once"""
+        async with self._contact_lock:
+            if self._contact_cache is None:
+                await self._load_contact_index()
+        return self._contact_cache
+    
     async def find_contact_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Find contact by email address"""
         try:
-            contacts = await self.get_contacts()
-            
-            for contact in contacts:
-                if contact.get('email', '').lower() == email.lower():
-                    logger.info(f"Found contact with email {email}")
-                    return contact
-            
-            logger.info(f"No contact found with email {email}")
-            return None
+            contacts_by_email = await self.list_all_contacts_indexed_by_email()
+            contact = contacts_by_email.get(email.lower())
+            if contact:
+                logger.info("Found contact with email %s", email)
+            else:
+                logger.info("No contact found with email %s", email)
+            return contact
             
         except Exception as e:
-            logger.error(f"Error finding contact by email: {str(e)}")
+            logger.error("Error finding contact by email: %s", e)
             raise
     
     async def create_contact(self, contact_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new contact in FreeAgent"""
         try:
             payload = {'contact': contact_data}
-            response = self._make_request('POST', '/contacts', json=payload)
+            response = await self._make_request('POST', '/contacts', json=payload)
             
             contact = response.get('contact', {})
-            logger.info(f"Created contact in FreeAgent: {contact.get('url')}")
+            logger.info("Created contact in FreeAgent: %s", contact.get('url'))
+            
+            if self._contact_cache is not None and contact.get('email'):
+                self._contact_cache[contact['email'].lower()] = contact
             return contact
             
         except Exception as e:
-            logger.error(f"Error creating contact: {str(e)}")
+            logger.error("Error creating contact: %s", e)
             raise
     
     async def create_invoice(self, invoice_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create an invoice in FreeAgent"""
         try:
             payload = {'invoice': invoice_data}
-            response = self._make_request('POST', '/invoices', json=payload)
+            response = await self._make_request('POST', '/invoices', json=payload)
             
             invoice = response.get('invoice', {})
-            logger.info(f"Created invoice in FreeAgent: {invoice.get('url')}")
+            logger.info("Created invoice in FreeAgent: %s", invoice.get('url'))
             return invoice
             
         except Exception as e:
-            logger.error(f"Error creating invoice: {str(e)}")
+            logger.error("Error creating invoice: %s", e)
             raise
     
     async def mark_invoice_as_sent(self, invoice_url: str) -> Dict[str, Any]:
@@ -112,12 +221,12 @@ class FreeAgentService:
                 }
             }
             
-            response = self._make_request('PUT', f"{endpoint}/transitions/mark_as_sent", json=payload)
-            logger.info(f"Marked invoice as sent: {invoice_url}")
+            response = await self._make_request('PUT', f"{endpoint}/transitions/mark_as_sent", json=payload)
+            logger.info("Marked invoice as sent: %s", invoice_url)
             return response
             
         except Exception as e:
-            logger.error(f"Error marking invoice as sent: {str(e)}")
+            logger.error("Error marking invoice as sent: %s", e)
             raise
     
     async def get_invoice(self, invoice_url: str) -> Dict[str, Any]:
@@ -125,9 +234,9 @@ class FreeAgentService:
         try:
             # Extract endpoint from full URL
             endpoint = invoice_url.replace(self.base_url, '')
-            response = self._make_request('GET', endpoint)
+            response = await self._make_request('GET', endpoint)
             return response.get('invoice', {})
             
         except Exception as e:
-            logger.error(f"Error getting invoice: {str(e)}")
+            logger.error("Error getting invoice: %s", e)
             raise
\ No newline at end of file
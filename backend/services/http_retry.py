@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+import logging
+import math
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+
+# Backoff waits go through this name so tests can replace it
+_sleep = asyncio.sleep
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds the server asked us to wait via Retry-After, if it said"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(seconds, 0.0) if math.isfinite(seconds) else None
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # A -0000 zone parses as naive, but HTTP dates are always GMT
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+async def send_with_retry(send: Callable[[], Awaitable[httpx.Response]], idempotent: bool = True) -> httpx.Response:
+    """Send a request, retrying transient failures with exponential backoff
+
+    Non-idempotent requests are only retried when the server cannot have
+    acted on them: failed connections and 429 responses. A Retry-After
+    longer than BACKOFF_MAX_SECONDS returns the response instead of waiting.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempt - 1), BACKOFF_MAX_SECONDS)
+
+        try:
+            response = await send()
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            reason = str(e)
+        except httpx.TransportError as e:
+            if not idempotent or attempt == MAX_ATTEMPTS:
+                raise
+            reason = str(e)
+        else:
+            retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUS_CODES)
+            if not retryable or attempt == MAX_ATTEMPTS:
+                return response
+
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                # Retrying sooner than asked would only be rejected again
+                if retry_after > BACKOFF_MAX_SECONDS:
+                    return response
+                delay = retry_after
+            reason = f"HTTP {response.status_code}"
+
+        logger.warning("Request attempt %s failed (%s), retrying in %ss", attempt, reason, delay)
+        await _sleep(delay)
@@ -1,18 +1,62 @@
+import asyncio
 import logging
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Set
 from datetime import datetime, timezone
-from decimal import Decimal
+from pymongo import UpdateOne
 
 logger = logging.getLogger(__name__)
 
+# Buffered Mongo writes are flushed once a collection has this many pending
+BULK_WRITE_BATCH_SIZE = 100
+
+# FreeAgent contact field, WHMCS client field, default
+_CONTACT_FIELDS = (
+    ('first_name', 'firstname', 'Unknown'),
+    ('last_name', 'lastname', 'Client'),
+    ('organisation_name', 'companyname', ''),
+    ('address1', 'address1', ''),
+    ('address2', 'address2', ''),
+    ('town', 'city', ''),
+    ('region', 'state', ''),
+    ('postcode', 'postcode', ''),
+    ('country', 'country', 'GB'),
+    ('phone_number', 'phonenumber', ''),
+)
+
+
+def _build_contact_data(whmcs_client: Dict[str, Any], email: str) -> Dict[str, Any]:
+    """Build a FreeAgent contact payload from WHMCS client details"""
+    contact_data = {field: whmcs_client.get(source, default) for field, source, default in _CONTACT_FIELDS}
+    contact_data['email'] = email
+    return contact_data
+
+
+@dataclass
+class _InvoiceSyncRun:
+    """State shared by the invoice workers of one sync run"""
+    clients: Dict[int, Dict[str, Any]]
+    mappings: Dict[int, str]
+    synced_ids: Set[int]
+    now: datetime
+    result: Dict[str, Any]
+    # In-flight contact resolutions, shared by invoices for the same client
+    contact_tasks: Dict[int, asyncio.Task] = field(default_factory=dict)
+    # Client mappings, written in bulk
+    pending: Dict[str, list] = field(default_factory=lambda: {'client_mappings': []})
+    # Follow-up FreeAgent calls that don't hold up the next invoice
+    background: List[asyncio.Task] = field(default_factory=list)
+
 
 class SyncService:
     """Service to sync invoices from WHMCS to FreeAgent"""
     
-    def __init__(self, whmcs_service, freeagent_service, db):
+    def __init__(self, whmcs_service, freeagent_service, db, concurrency: int = 10):
         self.whmcs = whmcs_service
         self.freeagent = freeagent_service
         self.db = db
+        # Maximum number of invoices processed at the same time
+        self.concurrency = concurrency
     
     async def sync_invoices(self) -> Dict[str, Any]:
         """Sync invoices from WHMCS to FreeAgent"""
@@ -24,6 +68,9 @@ class SyncService:
             'message': ''
         }
         
+        # Contacts may have changed in FreeAgent since the last run
+        self.freeagent.invalidate_contacts()
+        
         try:
             # Get invoices from WHMCS (last 30 days of unpaid/paid invoices)
             logger.info("Fetching invoices from WHMCS...")
@@ -33,146 +80,67 @@ class SyncService:
                 result['message'] = 'No invoices found in WHMCS'
                 return result
             
-            logger.info(f"Processing {len(whmcs_invoices)} invoices...")
+            logger.info("Processing %s invoices...", len(whmcs_invoices))
+            
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            # Load existing sync records in one query
+            invoice_ids = [int(invoice['id']) for invoice in whmcs_invoices]
+            synced_ids = {
+                synced['whmcs_invoice_id']
+                async for synced in self.db.synced_invoices.find(
+                    {'whmcs_invoice_id': {'$in': invoice_ids}},
+                    projection={'_id': 0, 'whmcs_invoice_id': 1}
+                )
+            }
+            
+            # Fetch each distinct client of an unsynced invoice once
+            client_ids = list({
+                int(invoice['userid'])
+                for invoice in whmcs_invoices
+                if invoice.get('userid') and int(invoice['id']) not in synced_ids
+            })
+            clients = await self._fetch_clients(client_ids, semaphore)
+            
+            # Load existing client mappings in one query
+            mappings = {
+                mapping['whmcs_client_id']: mapping['freeagent_contact_url']
+                async for mapping in self.db.client_mappings.find(
+                    {'whmcs_client_id': {'$in': client_ids}},
+                    projection={'_id': 0, 'whmcs_client_id': 1, 'freeagent_contact_url': 1}
+                )
+            }
             
-            for whmcs_invoice in whmcs_invoices:
+            # Index FreeAgent contacts up front when some clients still need one
+            if any(client_id not in mappings for client_id in client_ids):
                 try:
-                    result['invoices_processed'] += 1
-                    
-                    # Get detailed invoice data
-                    invoice_id = int(whmcs_invoice.get('id'))
-                    detailed_invoice = await self.whmcs.get_invoice(invoice_id)
-                    
-                    # Get or create FreeAgent contact
-                    client_id = int(detailed_invoice.get('userid'))
-                    whmcs_client = await self.whmcs.get_client(client_id)
-                    
-                    email = whmcs_client.get('email')
-                    if not email:
-                        logger.warning(f"Invoice {invoice_id}: No email for client {client_id}, skipping")
-                        result['errors'].append(f"Invoice {invoice_id}: No email for client")
-                        continue
-                    
-                    # Check if we already have a mapping
-                    mapping = await self.db.client_mappings.find_one({'whmcs_client_id': client_id})
-                    
-                    if mapping:
-                        freeagent_contact_url = mapping['freeagent_contact_url']
-                        logger.info(f"Using existing mapping for client {client_id}")
-                    else:
-                        # Find or create contact in FreeAgent
-                        freeagent_contact = await self.freeagent.find_contact_by_email(email)
-                        
-                        if not freeagent_contact:
-                            # Create new contact
-                            logger.info(f"Creating new contact in FreeAgent for {email}")
-                            
-                            contact_data = {
-                                'first_name': whmcs_client.get('firstname', 'Unknown'),
-                                'last_name': whmcs_client.get('lastname', 'Client'),
-                                'email': email,
-                                'organisation_name': whmcs_client.get('companyname', ''),
-                                'address1': whmcs_client.get('address1', ''),
-                                'address2': whmcs_client.get('address2', ''),
-                                'town': whmcs_client.get('city', ''),
-                                'region': whmcs_client.get('state', ''),
-                                'postcode': whmcs_client.get('postcode', ''),
-                                'country': whmcs_client.get('country', 'GB'),
-                                'phone_number': whmcs_client.get('phonenumber', '')
-                            }
-                            
-                            freeagent_contact = await self.freeagent.create_contact(contact_data)
-                            result['clients_created'] += 1
-                        
-                        freeagent_contact_url = freeagent_contact.get('url')
-                        
-                        # Save mapping
-                        await self.db.client_mappings.insert_one({
-                            'whmcs_client_id': client_id,
-                            'whmcs_email': email,
-                            'freeagent_contact_url': freeagent_contact_url,
-                            'created_at': datetime.now(timezone.utc)
-                        })
-                        
-                        logger.info(f"Saved mapping for client {client_id}")
-                    
-                    # Check if invoice already synced
-                    existing_invoice = await self.db.synced_invoices.find_one({
-                        'whmcs_invoice_id': invoice_id
-                    })
-                    
-                    if existing_invoice:
-                        logger.info(f"Invoice {invoice_id} already synced, skipping")
-                        continue
-                    
-                    # Create invoice in FreeAgent
-                    logger.info(f"Creating invoice {invoice_id} in FreeAgent...")
-                    
-                    # Parse invoice items
-                    items = detailed_invoice.get('items', [])
-                    invoice_items = []
-                    
-                    for item in items:
-                        invoice_items.append({
-                            'item_type': 'Services',  # Can be 'Hours', 'Days', 'Weeks', 'Months', 'Products', 'Services'
-                            'description': item.get('description', 'Service'),
-                            'quantity': 1.0,
-                            'price': float(item.get('amount', 0))
-                        })
-                    
-                    # If no items, create a single item with total
-                    if not invoice_items:
-                        invoice_items.append({
-                            'item_type': 'Services',
-                            'description': f"Invoice #{detailed_invoice.get('invoicenum', invoice_id)}",
-                            'quantity': 1.0,
-                            'price': float(detailed_invoice.get('subtotal', 0))
-                        })
-                    
-                    # Parse dates
-                    date_str = detailed_invoice.get('date', '')
-                    due_date_str = detailed_invoice.get('duedate', '')
-                    
-                    # Convert date format from YYYY-MM-DD to YYYY-MM-DD
-                    invoice_date = date_str if date_str else datetime.now(timezone.utc).strftime('%Y-%m-%d')
-                    due_date = due_date_str if due_date_str else invoice_date
-                    
-                    freeagent_invoice_data = {
-                        'contact': freeagent_contact_url,
-                        'dated_on': invoice_date,
-                        'due_on': due_date,
-                        'reference': f"wh-{invoice_id}",
-                        'currency': detailed_invoice.get('currencycode', 'GBP'),
-                        'payment_terms_in_days': 30,  # Default payment terms
-                        'invoice_items': invoice_items,
-                        'comments': f"Synced from WHMCS Invoice #{invoice_id}"
-                    }
-                    
-                    freeagent_invoice = await self.freeagent.create_invoice(freeagent_invoice_data)
-                    
-                    # Mark invoice as sent (not draft)
-                    try:
-                        await self.freeagent.mark_invoice_as_sent(freeagent_invoice.get('url'))
-                        logger.info(f"Invoice {invoice_id} marked as sent in FreeAgent")
-                    except Exception as e:
-                        logger.warning(f"Could not mark invoice as sent: {str(e)}")
-                    
-                    result['invoices_created'] += 1
-                    
-                    # Save sync record
-                    await self.db.synced_invoices.insert_one({
-                        'whmcs_invoice_id': invoice_id,
-                        'freeagent_invoice_url': freeagent_invoice.get('url'),
-                        'synced_at': datetime.now(timezone.utc)
-                    })
-                    
-                    logger.info(f"Successfully synced invoice {invoice_id}")
-                    
+                    await self.freeagent.list_all_contacts_indexed_by_email()
                 except Exception as e:
-                    error_msg = f"Error processing invoice {whmcs_invoice.get('id')}: {str(e)}"
-                    logger.error(error_msg)
-                    result['errors'].append(error_msg)
-                    continue
+                    # Invoices needing a contact retry the load and report it themselves
+                    logger.warning("Could not preload FreeAgent contacts: %s", e)
+            
+            run = _InvoiceSyncRun(
+                clients=clients,
+                mappings=mappings,
+                synced_ids=synced_ids,
+                now=datetime.now(timezone.utc),
+                result=result
+            )
+            
+            async def process(whmcs_invoice):
+                async with semaphore:
+                    await self._process_invoice(whmcs_invoice, run)
+            
+            try:
+                await asyncio.gather(*[process(invoice) for invoice in whmcs_invoices])
+                await asyncio.gather(*run.background)
+            finally:
+                # Stop calling FreeAgent once the run is cancelled or times out
+                for task in [*run.contact_tasks.values(), *run.background]:
+                    task.cancel()
+                
+                # Always record contacts already resolved in FreeAgent
+                await self._flush_writes(run.pending)
             
             # Build result message
             if result['invoices_created'] > 0:
@@ -186,9 +154,180 @@ class SyncService:
             return result
             
         except Exception as e:
-            logger.error(f"Sync failed: {str(e)}")
+            logger.error("Sync failed: %s", e)
             raise
     
+    async def _flush_writes(self, pending: Dict[str, list], threshold: int = 1):
+        """Bulk write each collection's buffered operations once threshold is reached"""
+        for collection, operations in pending.items():
+            if len(operations) >= threshold:
+                pending[collection] = []
+                await self.db[collection].bulk_write(operations, ordered=False)
+    
+    async def _fetch_clients(self, client_ids: List[int], semaphore: asyncio.Semaphore) -> Dict[int, Dict[str, Any]]:
+        """Fetch WHMCS client details concurrently, leaving out any that fail"""
+        async def fetch(client_id):
+            async with semaphore:
+                return await self.whmcs.get_client(client_id)
+        
+        clients = await asyncio.gather(*[fetch(client_id) for client_id in client_ids], return_exceptions=True)
+        return {
+            client_id: client
+            for client_id, client in zip(client_ids, clients)
+            if not isinstance(client, Exception)
+        }
+    
+    async def _resolve_contact(self, client_id: int, whmcs_client: Dict[str, Any], email: str, run: _InvoiceSyncRun) -> str:
+        """Find or create the FreeAgent contact for a WHMCS client and record the mapping"""
+        # Find or create contact in FreeAgent
+        freeagent_contact = await self.freeagent.find_contact_by_email(email)
+        
+        if not freeagent_contact:
+            # Create new contact
+            logger.info("Creating new contact in FreeAgent for %s", email)
+            
+            freeagent_contact = await self.freeagent.create_contact(_build_contact_data(whmcs_client, email))
+            run.result['clients_created'] += 1
+        
+        freeagent_contact_url = freeagent_contact.get('url')
+        run.mappings[client_id] = freeagent_contact_url
+        
+        # Save mapping
+        run.pending['client_mappings'].append(UpdateOne(
+            {'whmcs_client_id': client_id},
+            {
+                '$set': {
+                    'whmcs_email': email,
+                    'freeagent_contact_url': freeagent_contact_url
+                },
+                '$setOnInsert': {
+                    'created_at': run.now
+                }
+            },
+            upsert=True
+        ))
+        
+        logger.info("Saved mapping for client %s", client_id)
+        
+        return freeagent_contact_url
+    
+    async def _mark_invoice_as_sent(self, invoice_id: int, invoice_url: str):
+        """Mark a created FreeAgent invoice as sent, logging rather than raising on failure"""
+        try:
+            await self.freeagent.mark_invoice_as_sent(invoice_url)
+            logger.info("Invoice %s marked as sent in FreeAgent", invoice_id)
+        except Exception as e:
+            logger.warning("Could not mark invoice as sent: %s", e)
+    
+    async def _process_invoice(self, whmcs_invoice: Dict[str, Any], run: _InvoiceSyncRun):
+        """Sync a single WHMCS invoice to FreeAgent, recording the outcome in the run's result"""
+        result = run.result
+        now = run.now
+        
+        try:
+            result['invoices_processed'] += 1
+            
+            invoice_id = int(whmcs_invoice.get('id'))
+            
+            # Check if invoice already synced before fetching anything
+            if invoice_id in run.synced_ids:
+                logger.info("Invoice %s already synced, skipping", invoice_id)
+                return
+            
+            # Get detailed invoice data
+            detailed_invoice = await self.whmcs.get_invoice(invoice_id)
+            
+            # Get or create FreeAgent contact
+            client_id = int(detailed_invoice.get('userid'))
+            whmcs_client = run.clients.get(client_id) or await self.whmcs.get_client(client_id)
+            
+            email = whmcs_client.get('email')
+            if not email:
+                logger.warning("Invoice %s: No email for client %s, skipping", invoice_id, client_id)
+                result['errors'].append(f"Invoice {invoice_id}: No email for client")
+                return
+            
+            # Check if we already have a mapping
+            freeagent_contact_url = run.mappings.get(client_id)
+            
+            if freeagent_contact_url:
+                logger.info("Using existing mapping for client %s", client_id)
+            else:
+                # Share one resolution between concurrent invoices for the same
+                # client so they don't create duplicate FreeAgent contacts
+                task = run.contact_tasks.get(client_id)
+                if task is None:
+                    task = asyncio.ensure_future(self._resolve_contact(client_id, whmcs_client, email, run))
+                    run.contact_tasks[client_id] = task
+                freeagent_contact_url = await task
+            
+            # Create invoice in FreeAgent
+            logger.info("Creating invoice %s in FreeAgent...", invoice_id)
+            
+            # Parse invoice items
+            invoice_items = [
+                {
+                    'item_type': 'Services',  # Can be 'Hours', 'Days', 'Weeks', 'Months', 'Products', 'Services'
+                    'description': item.get('description', 'Service'),
+                    'quantity': 1.0,
+                    'price': float(item.get('amount') or 0)
+                }
+                for item in detailed_invoice.get('items', [])
+            ]
+            
+            # If no items, create a single item with total
+            if not invoice_items:
+                invoice_items.append({
+                    'item_type': 'Services',
+                    'description': f"Invoice #{detailed_invoice.get('invoicenum', invoice_id)}",
+                    'quantity': 1.0,
+                    'price': float(detailed_invoice.get('subtotal', 0))
+                })
+            
+            # Parse dates
+            date_str = detailed_invoice.get('date', '')
+            due_date_str = detailed_invoice.get('duedate', '')
+            
+            # Convert date format from YYYY-MM-DD to YYYY-MM-DD
+            invoice_date = date_str if date_str else now.strftime('%Y-%m-%d')
+            due_date = due_date_str if due_date_str else invoice_date
+            
+            freeagent_invoice_data = {
+                'contact': freeagent_contact_url,
+                'dated_on': invoice_date,
+                'due_on': due_date,
+                'reference': f"wh-{invoice_id}",
+                'currency': detailed_invoice.get('currencycode', 'GBP'),
+                'payment_terms_in_days': 30,  # Default payment terms
+                'invoice_items': invoice_items,
+                'comments': f"Synced from WHMCS Invoice #{invoice_id}"
+            }
+            
+            freeagent_invoice = await self.freeagent.create_invoice(freeagent_invoice_data)
+            
+            # Mark invoice as sent (not draft)
+            run.background.append(asyncio.create_task(
+                self._mark_invoice_as_sent(invoice_id, freeagent_invoice.get('url'))
+            ))
+            
+            result['invoices_created'] += 1
+            
+            # Save sync record straight away; it is the only guard against
+            # creating this invoice in FreeAgent again on the next run
+            await self.db.synced_invoices.insert_one({
+                'whmcs_invoice_id': invoice_id,
+                'freeagent_invoice_url': freeagent_invoice.get('url'),
+                'synced_at': now
+            })
+            await self._flush_writes(run.pending, BULK_WRITE_BATCH_SIZE)
+            
+            logger.info("Successfully synced invoice %s", invoice_id)
+            
+        except Exception as e:
+            error_msg = f"Error processing invoice {whmcs_invoice.get('id')}: {str(e)}"
+            logger.error(error_msg)
+            result['errors'].append(error_msg)
+    
     async def sync_payments_from_freeagent(self) -> Dict[str, Any]:
         """Sync payments from FreeAgent back to WHMCS"""
         result = {
@@ -199,107 +338,44 @@ class SyncService:
         }
         
         try:
-            logger.info("Fetching synced invoices for payment sync...")
+            logger.info("Checking synced invoices for payments...")
             
-            # Get all synced invoices from database
-            synced_invoices = await self.db.synced_invoices.find().to_list(1000)
+            # Stream synced invoices still awaiting payment from database
+            cursor = self.db.synced_invoices.find(
+                {'payment_synced': {'$ne': True}},
+                projection={'_id': 0, 'whmcs_invoice_id': 1, 'freeagent_invoice_url': 1}
+            )
             
-            if not synced_invoices:
-                result['message'] = 'No synced invoices found'
-                return result
+            semaphore = asyncio.Semaphore(self.concurrency)
+            tasks = []
+            now = datetime.now(timezone.utc)
             
-            logger.info(f"Checking {len(synced_invoices)} synced invoices for payments...")
+            # Payment status updates, written in bulk
+            pending = {'synced_invoices': []}
             
-            for synced in synced_invoices:
+            async def process(synced):
                 try:
-                    result['invoices_checked'] += 1
-                    whmcs_invoice_id = synced.get('whmcs_invoice_id')
-                    freeagent_invoice_url = synced.get('freeagent_invoice_url')
-                    
-                    # Skip if already marked as paid in our database
-                    if synced.get('payment_synced'):
-                        continue
-                    
-                    # First, check WHMCS invoice status BEFORE checking FreeAgent
-                    try:
-                        whmcs_invoice = await self.whmcs.get_invoice(whmcs_invoice_id)
-                        current_status = whmcs_invoice.get('status', '')
-                        
-                        # Skip if Draft - not ready for payments yet
-                        if current_status == 'Draft':
-                            logger.info(f"Invoice {whmcs_invoice_id} is Draft in WHMCS, skipping payment sync")
-                            continue
-                        
-                        # Skip if already paid, cancelled, or refunded in WHMCS
-                        if current_status in ['Paid', 'Cancelled', 'Refunded']:
-                            logger.info(f"Invoice {whmcs_invoice_id} is already {current_status} in WHMCS, skipping payment sync")
-                            # Mark as synced in database to prevent future checks
-                            await self.db.synced_invoices.update_one(
-                                {'whmcs_invoice_id': whmcs_invoice_id},
-                                {
-                                    '$set': {
-                                        'payment_synced': True,
-                                        'payment_synced_at': datetime.now(timezone.utc),
-                                        'already_paid_in_whmcs': True
-                                    }
-                                }
-                            )
-                            continue
-                    except Exception as e:
-                        logger.warning(f"Could not check WHMCS invoice status: {str(e)}")
-                        continue
-                    
-                    # Now check FreeAgent invoice for payment
-                    fa_invoice = await self.freeagent.get_invoice(freeagent_invoice_url)
-                    
-                    # Check if invoice is paid in FreeAgent
-                    if fa_invoice.get('status') != 'Paid':
-                        continue
-                    
-                    # Get payment amount and date
-                    total_paid = Decimal(str(fa_invoice.get('total_value', 0)))
-                    dated_on = fa_invoice.get('dated_on')
-                    
-                    # Format date for WHMCS (YYYY-MM-DD)
-                    if isinstance(dated_on, str):
-                        payment_date = dated_on  # Already in correct format
-                    else:
-                        payment_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-                    
-                    if total_paid <= 0:
-                        continue
-                    
-                    logger.info(f"Invoice {whmcs_invoice_id} is paid in FreeAgent, syncing payment to WHMCS...")
-                    
-                    # Add payment to WHMCS
-                    await self.whmcs.add_invoice_payment(
-                        invoice_id=whmcs_invoice_id,
-                        amount=float(total_paid),
-                        date=payment_date,
-                        transaction_id=f"FA-{whmcs_invoice_id}",
-                        gateway="banktransfer"
-                    )
-                    
-                    # Mark as synced in database
-                    await self.db.synced_invoices.update_one(
-                        {'whmcs_invoice_id': whmcs_invoice_id},
-                        {
-                            '$set': {
-                                'payment_synced': True,
-                                'payment_synced_at': datetime.now(timezone.utc),
-                                'payment_amount': float(total_paid)
-                            }
-                        }
-                    )
-                    
-                    result['payments_synced'] += 1
-                    logger.info(f"Payment synced for invoice {whmcs_invoice_id}")
-                    
-                except Exception as e:
-                    error_msg = f"Error syncing payment for invoice {synced.get('whmcs_invoice_id')}: {str(e)}"
-                    logger.error(error_msg)
-                    result['errors'].append(error_msg)
-                    continue
+                    await self._sync_invoice_payment(synced, now, pending, result)
+                finally:
+                    semaphore.release()
+            
+            try:
+                # Only read the next invoice once a worker slot is free
+                async for synced in cursor:
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(process(synced)))
+                
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                
+                # Always record payments already added in WHMCS
+                await self._flush_writes(pending)
+            
+            if not tasks:
+                result['message'] = 'No synced invoices found'
+                return result
             
             # Build result message
             if result['payments_synced'] > 0:
@@ -313,5 +389,100 @@ class SyncService:
             return result
             
         except Exception as e:
-            logger.error(f"Payment sync failed: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Payment sync failed: %s", e)
+            raise
+    
+    async def _sync_invoice_payment(self, synced: Dict[str, Any], now: datetime, pending: Dict[str, list], result: Dict[str, Any]):
+        """Copy a FreeAgent payment for one synced invoice to WHMCS, recording the outcome in result"""
+        try:
+            result['invoices_checked'] += 1
+            whmcs_invoice_id = synced.get('whmcs_invoice_id')
+            freeagent_invoice_url = synced.get('freeagent_invoice_url')
+            
+            # Fetch both sides at once; WHMCS status still decides what happens next
+            whmcs_invoice, fa_invoice = await asyncio.gather(
+                self.whmcs.get_invoice(whmcs_invoice_id),
+                self.freeagent.get_invoice(freeagent_invoice_url),
+                return_exceptions=True
+            )
+            
+            # First, check WHMCS invoice status BEFORE checking FreeAgent
+            if isinstance(whmcs_invoice, Exception):
+                logger.warning("Could not check WHMCS invoice status: %s", whmcs_invoice)
+                return
+            
+            current_status = whmcs_invoice.get('status', '')
+            
+            # Skip if Draft - not ready for payments yet
+            if current_status == 'Draft':
+                logger.info("Invoice %s is Draft in WHMCS, skipping payment sync", whmcs_invoice_id)
+                return
+            
+            # Skip if already paid, cancelled, or refunded in WHMCS
+            if current_status in ['Paid', 'Cancelled', 'Refunded']:
+                logger.info("Invoice %s is already %s in WHMCS, skipping payment sync", whmcs_invoice_id, current_status)
+                # Mark as synced in database to prevent future checks
+                pending['synced_invoices'].append(UpdateOne(
+                    {'whmcs_invoice_id': whmcs_invoice_id},
+                    {
+                        '$set': {
+                            'payment_synced': True,
+                            'payment_synced_at': now,
+                            'already_paid_in_whmcs': True
+                        }
+                    }
+                ))
+                return
+            
+            # Now check FreeAgent invoice for payment
+            if isinstance(fa_invoice, Exception):
+                raise fa_invoice
+            
+            # Check if invoice is paid in FreeAgent
+            if fa_invoice.get('status') != 'Paid':
+                return
+            
+            # Get payment amount and date
+            total_paid = float(fa_invoice.get('total_value') or 0)
+            dated_on = fa_invoice.get('dated_on')
+            
+            # Format date for WHMCS (YYYY-MM-DD)
+            if isinstance(dated_on, str):
+                payment_date = dated_on  # Already in correct format
+            else:
+                payment_date = now.strftime('%Y-%m-%d')
+            
+            if total_paid <= 0:
+                return
+            
+            logger.info("Invoice %s is paid in FreeAgent, syncing payment to WHMCS...", whmcs_invoice_id)
+            
+            # Add payment to WHMCS
+            await self.whmcs.add_invoice_payment(
+                invoice_id=whmcs_invoice_id,
+                amount=total_paid,
+                date=payment_date,
+                transaction_id=f"FA-{whmcs_invoice_id}",
+                gateway="banktransfer"
+            )
+            
+            # Mark as synced in database
+            pending['synced_invoices'].append(UpdateOne(
+                {'whmcs_invoice_id': whmcs_invoice_id},
+                {
+                    '$set': {
+                        'payment_synced': True,
+                        'payment_synced_at': now,
+                        'payment_amount': total_paid
+                    }
+                }
+            ))
+            await self._flush_writes(pending, BULK_WRITE_BATCH_SIZE)
+            
+            result['payments_synced'] += 1
+            logger.info("Payment synced for invoice %s", whmcs_invoice_id)
+            
+        except Exception as e:
+            error_msg = f"Error syncing payment for invoice {synced.get('whmcs_invoice_id')}: {str(e)}"
+            logger.error(error_msg)
+            result['errors'].append(error_msg)
@@ -1,9 +1,18 @@
-import requests
+import asyncio
+import httpx
 import logging
-from typing import List, Dict, Any, Optional
+import orjson
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from .http_retry import send_with_retry
 
 logger = logging.getLogger(__name__)
 
+# How long fetched client details are reused before asking WHMCS again
+CLIENT_CACHE_TTL_SECONDS = 300
+# Maximum clients kept at once, oldest fetches dropped first
+CLIENT_CACHE_MAX_ENTRIES = 1000
+
 
 class WHMCSService:
     """WHMCS API Service"""
@@ -13,9 +22,23 @@ class WHMCSService:
         self.api_url = f"{self.url}/includes/api.php"
         self.identifier = identifier
         self.secret = secret
-        self.session = requests.Session()
+        # Long-lived client; keep-alive connections are reused across syncs
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+        )
+        
+        # Client details keyed by client id, stored with their fetch time
+        self._client_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        # In-flight client requests, shared by concurrent callers
+        self._client_requests: Dict[int, asyncio.Task] = {}
     
-    def _make_request(self, action: str, **kwargs) -> Dict[str, Any]:
+    async def aclose(self):
+        """Close the underlying HTTP client"""
+        await self._client.aclose()
+    
+    async def _make_request(self, action: str, **kwargs) -> Dict[str, Any]:
         """Make API request to WHMCS"""
         data = {
             'identifier': self.identifier,
@@ -26,22 +49,28 @@ class WHMCSService:
         }
         
         try:
-            logger.debug(f"WHMCS API request: {action}")
-            response = self.session.post(self.api_url, data=data, timeout=30)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("WHMCS API request: %s", action)
+            # Only read actions are resent after a server error; writes such as
+            # AddInvoicePayment could otherwise be applied twice
+            response = await send_with_retry(
+                lambda: self._client.post(self.api_url, data=data),
+                idempotent=action.startswith('Get')
+            )
             response.raise_for_status()
             
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             
             # Check for WHMCS API errors
             if response_data.get('result') == 'error':
                 error_message = response_data.get('message', 'Unknown WHMCS API error')
-                logger.error(f"WHMCS API error: {error_message}")
+                logger.error("WHMCS API error: %s", error_message)
                 raise Exception(f"WHMCS API Error: {error_message}")
             
             return response_data
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"WHMCS API request failed: {str(e)}")
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            logger.error("WHMCS API request failed: %s", e)
             raise Exception(f"WHMCS API request failed: {str(e)}")
     
     async def get_invoices(self, limit: int = 100, status: str = None) -> List[Dict[str, Any]]:
@@ -56,7 +85,7 @@ class WHMCSService:
             if status:
                 params['status'] = status
             
-            response = self._make_request('GetInvoices', **params)
+            response = await self._make_request('GetInvoices', **params)
             
             invoices = []
             invoice_data = response.get('invoices', {}).get('invoice', [])
@@ -68,17 +97,17 @@ class WHMCSService:
             for invoice in invoice_data:
                 invoices.append(invoice)
             
-            logger.info(f"Retrieved {len(invoices)} invoices from WHMCS")
+            logger.info("Retrieved %s invoices from WHMCS", len(invoices))
             return invoices
             
         except Exception as e:
-            logger.error(f"Error getting invoices: {str(e)}")
+            logger.error("Error getting invoices: %s", e)
             raise
     
     async def get_invoice(self, invoice_id: int) -> Dict[str, Any]:
         """Get detailed invoice information"""
         try:
-            response = self._make_request('GetInvoice', invoiceid=invoice_id)
+            response = await self._make_request('GetInvoice', invoiceid=invoice_id)
             
             # Parse items
             if 'items' in response and 'item' in response['items']:
@@ -89,24 +118,52 @@ class WHMCSService:
             else:
                 response['items'] = []
             
-            logger.info(f"Retrieved invoice {invoice_id} from WHMCS")
+            logger.info("Retrieved invoice %s from WHMCS", invoice_id)
             return response
             
         except Exception as e:
-            logger.error(f"Error getting invoice {invoice_id}: {str(e)}")
+            logger.error("Error getting invoice %s: %s", invoice_id, e)
             raise
     
     async def get_client(self, client_id: int) -> Dict[str, Any]:
         """Get client details"""
+        cached = self._client_cache.get(client_id)
+        if cached and time.monotonic() - cached[0] < CLIENT_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        task = self._client_requests.get(client_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_client(client_id))
+            self._client_requests[client_id] = task
+            task.add_done_callback(lambda _: self._client_requests.pop(client_id, None))
+        return await task
+    
+    async def _fetch_client(self, client_id: int) -> Dict[str, Any]:
+        """Fetch client details from WHMCS and cache them"""
         try:
-            response = self._make_request('GetClientsDetails', clientid=client_id)
-            logger.info(f"Retrieved client {client_id} from WHMCS")
+            response = await self._make_request('GetClientsDetails', clientid=client_id)
+            logger.info("Retrieved client %s from WHMCS", client_id)
+            self._cache_client(client_id, response)
             return response
             
         except Exception as e:
-            logger.error(f"Error getting client {client_id}: {str(e)}")
+            logger.error("Error getting client %s: %s", client_id, e)
             raise
     
+    def _cache_client(self, client_id: int, client: Dict[str, Any]):
+        """Cache client details, dropping expired entries and the oldest beyond the size cap"""
+        now = time.monotonic()
+        # Re-insert so entries stay ordered by fetch time
+        self._client_cache.pop(client_id, None)
+        self._client_cache[client_id] = (now, client)
+        
+        while self._client_cache:
+            oldest_id = next(iter(self._client_cache))
+            fetched_at = self._client_cache[oldest_id][0]
+            if now - fetched_at < CLIENT_CACHE_TTL_SECONDS and len(self._client_cache) <= CLIENT_CACHE_MAX_ENTRIES:
+                break
+            del self._client_cache[oldest_id]
+    
     async def add_invoice_payment(self, invoice_id: int, amount: float, date: str, transaction_id: str = None, gateway: str = "banktransfer") -> Dict[str, Any]:
         """Add payment to WHMCS invoice"""
         try:
@@ -118,12 +175,12 @@ class WHMCSService:
                 'amount': amount
             }
             
-            response = self._make_request('AddInvoicePayment', **params)
-            logger.info(f"Added payment to invoice {invoice_id}: {amount}")
+            response = await self._make_request('AddInvoicePayment', **params)
+            logger.info("Added payment to invoice %s: %s", invoice_id, amount)
             return response
             
         except Exception as e:
-            logger.error(f"Error adding payment to invoice {invoice_id}: {str(e)}")
+            logger.error("Error adding payment to invoice %s: %s", invoice_id, e)
             raise
     
     async def update_invoice_status(self, invoice_id: int, status: str) -> Dict[str, Any]:
@@ -134,10 +191,10 @@ class WHMCSService:
                 'status': status
             }
             
-            response = self._make_request('UpdateInvoice', **params)
-            logger.info(f"Updated invoice {invoice_id} status to {status}")
+            response = await self._make_request('UpdateInvoice', **params)
+            logger.info("Updated invoice %s status to %s", invoice_id, status)
             return response
             
         except Exception as e:
-            logger.error(f"Error updating invoice {invoice_id} status: {str(e)}")
+            logger.error("Error updating invoice %s status: %s", invoice_id, e)
             raise
\ No newline at end of file
@@ -0,0 +1,133 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from services import http_retry  # noqa: E402
+from services.http_retry import send_with_retry  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def sleeps(monkeypatch):
+    """Record backoff delays instead of waiting them out"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(http_retry, '_sleep', fake_sleep)
+    return delays
+
+
+def run(method, outcomes, idempotent):
+    """Send one request through send_with_retry, answering attempts from outcomes in order"""
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        outcome = outcomes[min(len(attempts), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await send_with_retry(
+                lambda: client.request(method, 'https://api.example.com/invoices'),
+                idempotent=idempotent
+            )
+
+    try:
+        return asyncio.run(main()), attempts
+    except httpx.HTTPError as e:
+        return e, attempts
+
+
+@pytest.mark.parametrize('status_code', [500, 502, 503, 504])
+def test_non_idempotent_not_retried_on_server_error(status_code):
+    response, attempts = run('POST', [httpx.Response(status_code), httpx.Response(201)], idempotent=False)
+
+    assert response.status_code == status_code
+    assert len(attempts) == 1
+
+
+def test_non_idempotent_not_retried_on_read_error():
+    error, attempts = run('POST', [httpx.ReadError('connection reset'), httpx.Response(201)], idempotent=False)
+
+    assert isinstance(error, httpx.ReadError)
+    assert len(attempts) == 1
+
+
+def test_non_idempotent_retried_on_rate_limit():
+    response, attempts = run('POST', [httpx.Response(429), httpx.Response(201)], idempotent=False)
+
+    assert response.status_code == 201
+    assert len(attempts) == 2
+
+
+def test_non_idempotent_retried_on_connect_error():
+    response, attempts = run('POST', [httpx.ConnectError('refused'), httpx.Response(201)], idempotent=False)
+
+    assert response.status_code == 201
+    assert len(attempts) == 2
+
+
+def test_idempotent_retried_on_server_error_and_read_error():
+    response, attempts = run(
+        'GET', [httpx.Response(503), httpx.ReadError('connection reset'), httpx.Response(200)], idempotent=True
+    )
+
+    assert response.status_code == 200
+    assert len(attempts) == 3
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    response, attempts = run('GET', [httpx.Response(503)], idempotent=True)
+
+    assert response.status_code == 503
+    assert len(attempts) == http_retry.MAX_ATTEMPTS
+    assert sleeps == [0.5, 1.0]
+
+
+def test_retry_after_is_honoured(sleeps):
+    response, attempts = run(
+        'POST', [httpx.Response(429, headers={'Retry-After': '3'}), httpx.Response(201)], idempotent=False
+    )
+
+    assert response.status_code == 201
+    assert sleeps == [3.0]
+
+
+def test_long_retry_after_fails_fast(sleeps):
+    response, attempts = run(
+        'GET', [httpx.Response(429, headers={'Retry-After': '60'}), httpx.Response(200)], idempotent=True
+    )
+
+    assert response.status_code == 429
+    assert len(attempts) == 1
+    assert sleeps == []
+
+
+def test_retry_after_date_without_zone(sleeps):
+    response, attempts = run(
+        'POST',
+        [httpx.Response(429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 -0000'}), httpx.Response(201)],
+        idempotent=False
+    )
+
+    assert response.status_code == 201
+    assert sleeps == [0.0]
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', 'soon'])
+def test_unusable_retry_after_falls_back_to_backoff(sleeps, value):
+    response, attempts = run(
+        'POST', [httpx.Response(429, headers={'Retry-After': value}), httpx.Response(201)], idempotent=False
+    )
+
+    assert response.status_code == 201
+    assert sleeps == [http_retry.BACKOFF_BASE_SECONDS]